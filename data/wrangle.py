@@ -1,129 +1,150 @@
 import json
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from operator import itemgetter
 import string
-import os
-from yaml import load, dump
 import csv
 from difflib import SequenceMatcher
 import re
+from pathlib import Path
+
 try:
-    from yaml import CLoader as Loader, CDumper as Dumper
+    import orjson
 except ImportError:
-    from yaml import Loader, Dumper
+    orjson = None
+
+
+def read_json(path: str):
+    data = Path(path).read_bytes()
+    return orjson.loads(data) if orjson else json.loads(data)
+
+
+def write_json(path: str, obj, indent: bool = False):
+    # Serialize up front so each file is written with a single write call
+    if orjson:
+        data = orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+    elif indent:
+        data = json.dumps(obj, ensure_ascii=False, indent=2).encode()
+    else:
+        data = json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode()
+    Path(path).write_bytes(data)
 
 
-def split_by_continent():
-    with open("country_continent.json") as f:
-        data = json.load(f)
+def split_by_continent(countries: list) -> dict:
     res = defaultdict(list)
-    for obj in data:
+    for obj in countries:
         res[obj["continent"]].append(obj["country"])
     for v in res.values():
         v.sort()
-    with open("continent_to_country.json", "w") as f:
-        json.dump(res, f, indent=2)
+    write_json("continent_to_country.json", res)
+    # Key by the slug used in output file names so it is only computed once
+    return {k.replace(" ", "_").lower(): v for k, v in res.items()}
 
 
-def continent_fixup():
-    with open("country_continent.json") as f:
-        countries = json.load(f)
+def continent_fixup(countries: list) -> list:
     for c in countries:
         if c["country"] == "Holy See (Vatican City State)":
             c["country"] = "Vatican City"
-    countries.sort(key=lambda x: x["country"])
-    with open("country_continent.json", "w") as f:
-        json.dump(countries, f, indent=2)
+    countries.sort(key=itemgetter("country"))
+    write_json("country_continent.json", countries, indent=True)
+    return countries
+
+
+capital_overrides = {
+    "Belgium": "Brussels",
+    "Colombia": "Bogota",
+    "Finland": "Helsinki",
+    "Vatican City": "Vatican City",
+    "Luxembourg": "Luxembourg",
+    "Marshall Islands": "Majuro",
+    "Mexico": "Mexico City",
+    "Myanmar": "Naypyidaw",
+    "Palau": "Ngerulmud",
+    "Palestine": "Ramallah",
+    "Panama": "Panama City",
+    "Sri Lanka": "Colombo",
+    "Togo": "Lome",
+    "Western Sahara": "Laayoune",
+    "Chile": "Santiago",
+    "Cuba": "Havana",
+    "Dominican Republic": "Santo Domingo",
+    "Guatemala": "Guatemala City",
+    "Cook Islands": "Avarua",
+    "China": "Beijing",
+    "Bahrain": "Manama",
+    "Mongolia": "Ulaanbaatar",
+    "Oman": "Muscat",
+    "Uzbekistan": "Tashkent",
+    "Austria": "Vienna",
+    "Czech Republic": "Prague",
+    "Faroe Islands": "Torshavn",
+    "Greece": "Athens",
+    "Monaco": "Monaco",
+    "Italy": "Rome",
+    "Romania": "Bucharest",
+    "Portugal": "Lisbon",
+    "Poland": "Warsaw",
+}
+
+
+def capital_fixup(capitals: list) -> list:
+    capitals = {c["country"]: c["city"] for c in capitals}
+    capitals.update(capital_overrides)
+    capitals.pop("Holy See (Vatican City State)", None)
+    capitals = sorted(
+        ({"country": k, "city": v} for k, v in capitals.items()),
+        key=itemgetter("country"),
+    )
+    write_json("country_capital.json", capitals, indent=True)
+    return capitals
 
 
-def capital_fixup():
-    with open("country_capital.json") as f:
-        capitals = json.load(f)
-    capitals = {c["country"]: c["city"] for c in capitals}
+def bucket_by_continent(continents: dict, items: list) -> dict:
+    country_to_continent = {c: cont for cont, cs in continents.items() for c in cs}
+    buckets = defaultdict(list)
+    for item in items:
+        cont = country_to_continent.get(item["country"])
+        if cont is not None:
+            buckets[cont].append(item)
+    return buckets
 
-    capitals["Belgium"] = "Brussels"
-    capitals["Colombia"] = "Bogota"
-    capitals["Finland"] = "Helsinki"
-    capitals.pop("Holy See (Vatican City State)", None)
-    capitals["Vatican City"] = "Vatican City"
-    capitals["Luxembourg"] = "Luxembourg"
-    capitals["Marshall Islands"] = "Majuro"
-    capitals["Mexico"] = "Mexico City"
-    capitals["Myanmar"] = "Naypyidaw"
-    capitals["Palau"] = "Ngerulmud"
-    capitals["Palestine"] = "Ramallah"
-    capitals["Panama"] = "Panama City"
-    capitals["Sri Lanka"] = "Colombo"
-    capitals["Togo"] = "Lome"
-    capitals["Western Sahara"] = "Laayoune"
-    capitals["Chile"] = "Santiago"
-    capitals["Cuba"] = "Havana"
-    capitals["Dominican Republic"] = "Santo Domingo"
-    capitals["Guatemala"] = "Guatemala City"
-    capitals["Cook Islands"] = "Avarua"
-    capitals["China"] = "Beijing"
-    capitals["Bahrain"] = "Manama"
-    capitals["Mongolia"] = "Ulaanbaatar"
-    capitals["Oman"] = "Muscat"
-    capitals["Uzbekistan"] = "Tashkent"
-    capitals["Austria"] = "Vienna"
-    capitals["Czech Republic"] = "Prague"
-    capitals["Faroe Islands"] = "Torshavn"
-    capitals["Greece"] = "Athens"
-    capitals["Monaco"] = "Monaco"
-    capitals["Italy"] = "Rome"
-    capitals["Romania"] = "Bucharest"
-    capitals["Portugal"] = "Lisbon"
-    capitals["Poland"] = "Warsaw"
-
-    capitals = [{"country": k, "city": v} for k, v in capitals.items()]
-    capitals.sort(key=lambda x: x["country"])
-    with open("country_capital.json", "w") as f:
-        json.dump(capitals, f, indent=2)
-
-
-def continent_to_capitals():
-    with open("continent_to_country.json") as f:
-        continents = json.load(f)
-    with open("country_capital.json") as f:
-        capitals = json.load(f)
-    printable = set(string.printable)
-    fprint = lambda s: "".join(ss for ss in s if ss in printable)
-    for cont, countries in continents.items():
-        cs = [cc for cc in capitals if cc["country"] in countries and cc["city"]]
-        cs = [{fprint(k): fprint(v) for k, v in c.items()} for c in cs]
-        if len(cs) == 0:
-            continue
-        cont = cont.replace(" ", "_").lower()
-        with open(f"{cont}_capitals.json", "w") as f:
-            json.dump(cs, f, indent=2)
-
-
-def continent_capitals_questions():
-    for p in os.listdir("."):
-        if not p.endswith("_capitals.json"):
-            continue
-        with open(p) as f:
-            data = json.load(f)
-        continent = p.removesuffix("_capitals.json")
-        items = [
-            {
-                "id": to_id(d["country"]),
-                "question": d["country"],
-                "answers": [d["city"]],
-            }
-            for d in data
-        ]
-        items.sort(key=lambda x: x["question"])
-        questions = {
-            "name": continent + "_capitals",
-            "type_": "default",
-            "items": items,
-            "data": {
-                "question_prefix": "What is the capital of ",
-            },
+
+# string.printable is pure ASCII, so only the non-printable ASCII control
+# characters need an explicit deletion table.
+_non_printable = dict.fromkeys(c for c in range(128) if chr(c) not in string.printable)
+_printable = frozenset(string.printable)
+
+
+def is_printable(s: str) -> bool:
+    return _printable.issuperset(s)
+
+
+def fprint(s: str) -> str:
+    if is_printable(s):
+        return s
+    return s.encode("ascii", "ignore").decode("ascii").translate(_non_printable)
+
+
+def continent_capitals_questions(continent: str, data: list):
+    items = [
+        {
+            "id": to_id(d["country"]),
+            "question": d["country"],
+            "answers": [d["city"]],
         }
-        with open(f"questions/{continent}_capitals.yaml", "w") as f:
-            dump(questions, f, Dumper=Dumper, sort_keys=False)
+        for d in data
+    ]
+    items.sort(key=itemgetter("question"))
+    questions = {
+        "name": continent + "_capitals",
+        "type_": "default",
+        "items": items,
+        "data": {
+            "question_prefix": "What is the capital of ",
+        },
+    }
+    # JSON is a subset of YAML, so the question loaders still accept it
+    write_json(f"questions/{continent}_capitals.yaml", questions)
 
 
 allowed_chars = "abcdefghijklmnopqrstuvwxyz0123456789-_."
@@ -136,176 +157,146 @@ def to_id(s: str) -> str:
     return s
 
 
-def continent_to_areas():
-    with open("continent_to_country.json") as f:
-        continents = json.load(f)
-    with open("country_area.json") as f:
-        areas = json.load(f)
-    min_area = 1000
-    areas = [item for item in areas if item["area"] > min_area]
-    # printable = set(string.printable)
-    # fprint = lambda s: "".join(ss for ss in s if ss in printable)
-    for continent, countries in continents.items():
-        continent_areas = [item for item in areas if item["country"] in countries]
-        if len(continent_areas) == 0:
-            continue
-        continent = continent.replace(" ", "_").lower()
-        with open(f"{continent}_areas.json", "w") as f:
-            json.dump(continent_areas, f, indent=2)
-
-
-def continent_area_questions():
-    for p in os.listdir("."):
-        if not p.endswith("_areas.json"):
-            continue
-        with open(p) as f:
-            data = json.load(f)
-        continent = p.removesuffix("_areas.json")
-        items = [
-            {
-                "id": to_id(d["country"]),
-                "question": d["country"],
-                "answer": int(d["area"]),
-            }
-            for d in data
-        ]
-        items.sort(key=lambda x: x["question"])
-        questions = {
-            "name": continent + "_areas",
-            "type_": "numeric_range",
-            "items": items,
-            "data": {
-                "question_prefix": "What is the area (km^2) of ",
-                "range": 0.025,
-            },
+def continent_area_questions(continent: str, data: list):
+    items = [
+        {
+            "id": to_id(d["country"]),
+            "question": d["country"],
+            "answer": int(d["area"]),
         }
-        with open(f"questions/{continent}_areas.yaml", "w") as f:
-            dump(questions, f, Dumper=Dumper, sort_keys=False)
-
-
-def gen_capital_questions():
-    continent_fixup()
-    split_by_continent()
-    capital_fixup()
-    continent_to_capitals()
-    continent_capitals_questions()
-
-
-def gen_area_questions():
-    continent_fixup()
-    split_by_continent()
-    continent_to_areas()
-    continent_area_questions()
-
-
-def population_json():
-    populations = {}
-    with open("world_population.csv") as f:
-        reader = csv.reader(f)
-        for line in reader:
-            country, pop = line[3], line[4]
-            population = int(pop.replace(",", "")) * 1000
-            populations[country.strip()] = population
-
-    renames = [
-        ("Egypt, Arab Rep.", "Egypt"),
-        ("Congo, Dem. Rep.", "The Democratic Repuplic of Congo"),
-        ("Viet Nam", "Vietnam"),
-        ("Iran, Islamic Rep.", "Iran"),
-        ("Türkiye", "Turkey"),
-        ("Korea, Rep.", "South Korea"),
-        ("Yemen, Rep.", "Yemen"),
-        ("Venezuela, RB", "Venezuela"),
-        ("Côte d'Ivoire", "Ivory Coast"),
-        ("Korea, Dem. People's Rep.", "North Korea"),
-        ("Syrian Arab Republic", "Syria"),
-        ("Lao PDR", "Laos"),
-        ("Hong Kong SAR, China", "Hong Kong"),
-        ("Kyrgyz Republic", "Kyrgyzstan"),
-        ("Libya", "Libyan Arab Jamahiriya"),
-        ("Congo, Rep.", "Congo"),
-        ("Slovak Republic", "Slovakia"),
-        ("West Bank and Gaza", "Palestine"),
-        ("Gambia, The", "Gambia"),
-        ("Timor-Leste", "East Timor"),
-        ("Eswatini", "Swaziland"),
-        ("Fiji", "Fiji Islands"),
-        ("Macao SAR, China", "Macao"),
-        ("Cabo Verde", "Cape Verde"),
-        ("Brunei Darussalam", "Brunei"),
-        ("Bahamas, The", "Bahamas"),
-        ("São Tomé and Principe", "Sao Tome and Principe"),
-        ("St. Lucia", "Saint Lucia"),
-        ("Curaçao", "Netherlands Antilles"),
-        ("Micronesia, Fed. Sts.", "Micronesia, Federated States of"),
-        ("Virgin Islands (U.S.)", "Virgin Islands, U.S."),
-        ("St. Vincent and the Grenadines", "Saint Vincent and the Grenadines"),
-        ("St. Kitts and Nevis", "Saint Kitts and Nevis"),
-        ("British Virgin Islands", "Virgin Islands, British"),
+        for d in data
     ]
-    for a, b in renames:
-        rename(populations, a, b)
+    items.sort(key=itemgetter("question"))
+    questions = {
+        "name": continent + "_areas",
+        "type_": "numeric_range",
+        "items": items,
+        "data": {
+            "question_prefix": "What is the area (km^2) of ",
+            "range": 0.025,
+        },
+    }
+    write_json(f"questions/{continent}_areas.yaml", questions)
+
+
+renames = {
+    "Egypt, Arab Rep.": "Egypt",
+    "Congo, Dem. Rep.": "The Democratic Repuplic of Congo",
+    "Viet Nam": "Vietnam",
+    "Iran, Islamic Rep.": "Iran",
+    "Türkiye": "Turkey",
+    "Korea, Rep.": "South Korea",
+    "Yemen, Rep.": "Yemen",
+    "Venezuela, RB": "Venezuela",
+    "Côte d'Ivoire": "Ivory Coast",
+    "Korea, Dem. People's Rep.": "North Korea",
+    "Syrian Arab Republic": "Syria",
+    "Lao PDR": "Laos",
+    "Hong Kong SAR, China": "Hong Kong",
+    "Kyrgyz Republic": "Kyrgyzstan",
+    "Libya": "Libyan Arab Jamahiriya",
+    "Congo, Rep.": "Congo",
+    "Slovak Republic": "Slovakia",
+    "West Bank and Gaza": "Palestine",
+    "Gambia, The": "Gambia",
+    "Timor-Leste": "East Timor",
+    "Eswatini": "Swaziland",
+    "Fiji": "Fiji Islands",
+    "Macao SAR, China": "Macao",
+    "Cabo Verde": "Cape Verde",
+    "Brunei Darussalam": "Brunei",
+    "Bahamas, The": "Bahamas",
+    "São Tomé and Principe": "Sao Tome and Principe",
+    "St. Lucia": "Saint Lucia",
+    "Curaçao": "Netherlands Antilles",
+    "Micronesia, Fed. Sts.": "Micronesia, Federated States of",
+    "Virgin Islands (U.S.)": "Virgin Islands, U.S.",
+    "St. Vincent and the Grenadines": "Saint Vincent and the Grenadines",
+    "St. Kitts and Nevis": "Saint Kitts and Nevis",
+    "British Virgin Islands": "Virgin Islands, British",
+}
+
+
+_no_comma = str.maketrans("", "", ",")
+
+
+def population_json() -> list:
+    populations = {}
+    # The CSV has no header row but starts with a byte order mark
+    data = Path("world_population.csv").read_text(encoding="utf-8-sig")
+    for line in csv.reader(data.splitlines()):
+        country, pop = line[3].strip(), line[4]
+        population = int(pop.translate(_no_comma)) * 1000
+        populations[renames.get(country, country)] = population
     populations = [{"country": k, "population": v} for k, v in populations.items()]
-    with open("country_population.json", "w") as f:
-        json.dump(populations, f, indent=2)
-
-
-def rename(d: dict, key1: str, key2: str):
-    obj = d[key1]
-    del d[key1]
-    d[key2] = obj
-
-
-def continent_to_population():
-    with open("continent_to_country.json") as f:
-        continents = json.load(f)
-    with open("country_population.json") as f:
-        populations = json.load(f)
-
-    for continent, countries in continents.items():
-        continent = continent.replace(" ", "_").lower()
-        continent_pops = [c for c in populations if c["country"] in countries]
-        with open(f"{continent}_populations.json", "w") as f:
-            json.dump(continent_pops, f, indent=2)
-
-
-def continent_population_questions():
-    for p in os.listdir("."):
-        if not p.endswith("_populations.json"):
-            continue
-        with open(p) as f:
-            data = json.load(f)
-        continent = p.removesuffix("_populations.json")
-        items = [
-            {
-                "id": to_id(d["country"]),
-                "question": d["country"],
-                "answer": int(d["population"]),
-            }
-            for d in data
-        ]
-        items.sort(key=lambda x: x["question"])
-        questions = {
-            "name": continent + "_populations",
-            "type_": "numeric_range",
-            "items": items,
-            "data": {
-                "question_prefix": "What is the population of ",
-                "range": 0.025,
-            },
-        }
-        with open(f"questions/{continent}_populations.yaml", "w") as f:
-            dump(questions, f, Dumper=Dumper, sort_keys=False)
+    write_json("country_population.json", populations)
+    return populations
 
 
-def gen_population_questions():
-    continent_fixup()
-    split_by_continent()
-    population_json()
-    continent_to_population()
-    continent_population_questions()
+def continent_population_questions(continent: str, data: list):
+    items = [
+        {
+            "id": to_id(d["country"]),
+            "question": d["country"],
+            "answer": int(d["population"]),
+        }
+        for d in data
+    ]
+    items.sort(key=itemgetter("question"))
+    questions = {
+        "name": continent + "_populations",
+        "type_": "numeric_range",
+        "items": items,
+        "data": {
+            "question_prefix": "What is the population of ",
+            "range": 0.025,
+        },
+    }
+    write_json(f"questions/{continent}_populations.yaml", questions)
+
+
+def write_continent(continent: str, capitals: list, areas: list, populations: list):
+    # Most rows are already printable, so only rebuild the ones that are not
+    capitals = [
+        c
+        if all(map(is_printable, c.values()))
+        else {k: fprint(v) for k, v in c.items()}
+        for c in capitals
+    ]
+    if capitals:
+        write_json(f"{continent}_capitals.json", capitals)
+        continent_capitals_questions(continent, capitals)
+    if areas:
+        write_json(f"{continent}_areas.json", areas)
+        continent_area_questions(continent, areas)
+    write_json(f"{continent}_populations.json", populations)
+    continent_population_questions(continent, populations)
+
+
+def build_all():
+    countries = continent_fixup(read_json("country_continent.json"))
+    continents = split_by_continent(countries)
+    capitals = capital_fixup(read_json("country_capital.json"))
+    capitals = bucket_by_continent(continents, [c for c in capitals if c["city"]])
+    min_area = 1000
+    areas = [item for item in read_json("country_area.json") if item["area"] > min_area]
+    areas = bucket_by_continent(continents, areas)
+    populations = bucket_by_continent(continents, population_json())
+    # Each continent writes its own files, so they can be emitted concurrently
+    with ThreadPoolExecutor(max_workers=8) as ex:
+        futures = [
+            ex.submit(
+                write_continent,
+                continent,
+                capitals[continent],
+                areas[continent],
+                populations[continent],
+            )
+            for continent in continents
+        ]
+        for future in futures:
+            future.result()
 
 
-gen_capital_questions()
-gen_area_questions()
-gen_population_questions()
+if __name__ == "__main__":
+    build_all()